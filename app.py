@@ -1,245 +1,707 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request
+from flask_compress import Compress
 import requests
-import json
+from requests.adapters import HTTPAdapter
+import orjson
+import atexit
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from logging.handlers import QueueHandler, QueueListener
+from collections import OrderedDict
+from rapidfuzz.distance import Indel, Levenshtein
 
 app = Flask(__name__)
+# gzip/brotli responses when the client accepts it; tiny error bodies are left as-is
+app.config["COMPRESS_MIN_SIZE"] = 256
+Compress(app)
+
+# Request-path logging goes through a queue; a background listener does the
+# formatting and the actual terminal writes so handlers never block on stdout.
+class _DeferredQueueHandler(QueueHandler):
+    """QueueHandler that enqueues records as-is, leaving %-formatting to the listener."""
+
+    def prepare(self, record):
+        # The stock prepare() formats the message on the calling thread; the
+        # queue never leaves this process, so the raw record can be passed on
+        return record
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+logger.propagate = False
+_LOG_QUEUE = queue.SimpleQueue()
+logger.addHandler(_DeferredQueueHandler(_LOG_QUEUE))
+_terminal_handler = logging.StreamHandler()
+_terminal_handler.setFormatter(logging.Formatter("[TERMINAL] %(message)s"))
+_LOG_LISTENER = QueueListener(_LOG_QUEUE, _terminal_handler)
+_LOG_LISTENER.start()
+atexit.register(_LOG_LISTENER.stop)
 
 # Configuration
 OLLAMA_URL = "http://localhost:11434"
-MODEL_NAME = "tinyllama"
+# INT4 weight-only (GGUF k-quant) build of TinyLlama: decode at batch size 1 is
+# memory-bandwidth bound, so smaller weights mean faster tokens. Override with
+# SPELLCHECK_MODEL, e.g. "tinyllama:1.1b-chat-v1-q8_0" on GPUs with fast 8-bit paths.
+MODEL_NAME = os.getenv("SPELLCHECK_MODEL", "tinyllama:1.1b-chat-v1-q4_K_M")
+# Optional small draft model for speculative decoding. Spell-check output is
+# nearly a copy of the input, so most drafted tokens should be accepted.
+# Unset by default; only sent to Ollama when configured.
+DRAFT_MODEL = os.getenv("OLLAMA_DRAFT_MODEL")
+# Longest input /check accepts; anything larger is rejected with 413
+# before it can tie up a worker on a long generation
+MAX_TEXT_CHARS = int(os.getenv("SPELLCHECK_MAX_CHARS", "2000"))
+MAX_TEXT_WORDS = int(os.getenv("SPELLCHECK_MAX_WORDS", "300"))
+CACHE_MAXSIZE = 4096
+# Concurrent /check requests are folded into one Ollama call of up to
+# BATCH_MAX_SIZE texts, gathered over at most BATCH_WAIT seconds. Every
+# caller waits for the whole decode, so a batch also stops growing once its
+# summed decode budget would pass BATCH_TOKEN_BUDGET tokens.
+BATCH_MAX_SIZE = 8
+BATCH_TOKEN_BUDGET = 200
+BATCH_WAIT = 0.02
+BATCH_RESULT_TIMEOUT = 60
+# Threads that re-check batch items the model did not answer usably
+BATCH_RETRY_WORKERS = 2
+# How long Ollama keeps the model loaded after a request
+OLLAMA_KEEP_ALIVE = "30m"
+# Sent unchanged on every /api/chat call so Ollama can keep its KV cache
+# warm and each request only pays prefill for the user's text. Kept short and
+# direct: TinyLlama works better with simple instructions than few-shot examples.
+SYSTEM_PROMPT = "You are a spell-checker. Reply only with the corrected text."
+# Connections kept open to Ollama per process; match it to the number of
+# threads (or greenlets) a server worker runs concurrently
+POOL_MAXSIZE = int(os.getenv("SPELLCHECK_POOL_MAXSIZE", "64"))
 
+# Word list used to skip the LLM when every word is already valid.
+# Override with SPELLCHECK_WORDLIST; if the file is missing the prefilter is off.
+WORDLIST_PATH = os.getenv("SPELLCHECK_WORDLIST", "/usr/share/dict/words")
 
-def check_spelling_grammar(text, model=MODEL_NAME, ollama_url=OLLAMA_URL):
+# One pooled session for all calls to Ollama, so connections are reused
+# instead of opening a new TCP connection per request.
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=16, pool_maxsize=POOL_MAXSIZE, max_retries=0))
+SESSION.headers.update({"Content-Type": "application/json"})
+
+# Process-local LRU of finished results, keyed by normalized input text.
+# Flask serves requests from several threads, so access goes through a lock.
+_CACHE = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+
+
+def load_dictionary(path=WORDLIST_PATH):
+    """Load a newline-separated word list into a lowercase frozenset (empty if unavailable)."""
+    try:
+        with open(path, encoding="utf-8", errors="ignore") as f:
+            return frozenset(line.strip().lower() for line in f if line.strip())
+    except OSError:
+        return frozenset()
+
+
+DICTIONARY = load_dictionary()
+# Words with inner apostrophes ("don't"), never leading or trailing quotes
+_DICT_WORD_RE = re.compile(r"[a-z]+(?:'[a-z]+)*")
+
+
+def all_words_known(text):
+    """Return True if every word in text is in DICTIONARY, so there is nothing to correct."""
+    if not DICTIONARY:
+        return False
+    # Fold case once and let frozenset.issuperset do the lookups in C
+    return DICTIONARY.issuperset(_DICT_WORD_RE.findall(text.lower()))
+
+
+# Labels the model likes to put in front of its answer
+PREFIXES_TO_REMOVE = [
+    "Corrected version:", "Corrected text:", "Corrected:",
+    "Corrected spelling:", "Corrected Spelling:",
+    "Text:", "Fixed:", "Correction:", "The corrected version is:",
+    "Here is the corrected text:", "Here's the correction:",
+    "The text should be:", "It should be:", "Answer:",
+    "Spelling:", "Fixed spelling:", "Fixed Spelling:"
+]
+
+# Openings that mean the model is explaining rather than answering
+EXPLANATION_STARTERS = [
+    "I think", "This is", "The error", "Note that", "In this",
+    "Here,", "Because", "Since", "As you can see", "The word"
+]
+
+# Compiled once so each response is matched in a single pass
+_PREFIX_RE = re.compile(
+    r"^(?:" + "|".join(re.escape(p) for p in PREFIXES_TO_REMOVE) + r")\s*",
+    re.IGNORECASE
+)
+_EXPLANATION_RE = re.compile("|".join(re.escape(starter) for starter in EXPLANATION_STARTERS))
+_WORD_RE = re.compile(r'\b\w+\b')
+
+
+def _cache_key(text):
+    """Normalize text for cache lookups (surrounding and repeated whitespace)."""
+    return ' '.join(text.split())
+
+
+def cache_lookup(text):
+    """Return the cached result for text, or None on a miss."""
+    key = _cache_key(text)
+    with _CACHE_LOCK:
+        hit = _CACHE.get(key)
+        if hit is not None:
+            _CACHE.move_to_end(key)
+        return hit
+
+
+def cache_update(text, result):
+    """Store a successful result, evicting the least recently used past CACHE_MAXSIZE."""
+    key = _cache_key(text)
+    with _CACHE_LOCK:
+        _CACHE[key] = result
+        _CACHE.move_to_end(key)
+        while len(_CACHE) > CACHE_MAXSIZE:
+            _CACHE.popitem(last=False)
+
+
+class OllamaStreamError(Exception):
+    """Raised when Ollama reports an error inside an otherwise successful stream."""
+
+
+def read_streamed_response(response, max_words, keep_words=None):
     """
-    Send text to Ollama for spell check and grammar correction.
+    Collect a streamed Ollama /api/chat response, stopping early.
+
+    Reading stops as soon as Ollama reports it is done, a blank-line stop
+    sequence appears, or the output grows past max_words words. Closing the
+    response early makes Ollama abandon the rest of the generation.
+
+    When the word budget is what stopped the stream, the last word is dropped
+    (it is usually only the first piece of a word) and, if keep_words is set,
+    the output is trimmed to that many words.
 
     Args:
-        text (str): The text to check
-        model (str): Ollama model to use (default: "tinyllama")
-        ollama_url (str): Ollama server URL (default: "http://localhost:11434")
+        response (requests.Response): Response opened with stream=True
+        max_words (int): Word budget after which generation is cut off
+        keep_words (int): Words to keep when the budget cut the stream off
 
     Returns:
-        dict: Dictionary containing corrected text, misspelled words, and suggestions
+        str: The generated text
+
+    Raises:
+        OllamaStreamError: If a chunk carries an "error" field
     """
-    if not text or not text.strip():
-        return {
-            "corrected_text": "",
-            "misspelled_words": [],
-            "error": "No text provided"
-        }
+    generated = ""
+    over_budget = False
+    try:
+        for line in response.iter_lines():
+            if not line:
+                continue
+            chunk = orjson.loads(line)
+            if chunk.get("error"):
+                raise OllamaStreamError(chunk["error"])
+            generated += chunk.get("message", {}).get("content", "")
+            if not generated.strip():
+                continue
+            if chunk.get("done") or "\n\n" in generated.lstrip():
+                break
+            if len(generated.split()) > max_words:
+                over_budget = True
+                break
+    finally:
+        response.close()
+
+    generated = generated.lstrip().split("\n\n", 1)[0]
+    if over_budget:
+        # rsplit keeps the line breaks batch answers rely on
+        generated = generated.rstrip().rsplit(None, 1)[0]
+        if keep_words is not None:
+            generated = ' '.join(generated.split()[:keep_words])
+    return generated
+
 
-    # Create a simple, direct prompt
-    # TinyLlama works better with simple instructions than few-shot examples
-    prompt = f"""Correct the spelling in this text: {text}
+def num_predict_for(n_words):
+    """Decode budget for an input of n_words words; short inputs only need a short decode."""
+    return min(100, max(16, int(n_words * 2.5) + 4))
 
-Only write the corrected version, nothing else:"""
 
+def generate_text(prompt, num_predict, max_words, model=MODEL_NAME, ollama_url=OLLAMA_URL,
+                  keep_words=None):
+    """
+    Run one streamed chat completion against Ollama.
+
+    Args:
+        prompt (str): User turn sent after SYSTEM_PROMPT
+        num_predict (int): Token budget for the decode
+        max_words (int): Word count after which the stream is cut off
+        model (str): Ollama model to use (default: MODEL_NAME)
+        ollama_url (str): Ollama server URL (default: "http://localhost:11434")
+        keep_words (int): Words to keep if the stream was cut off (see read_streamed_response)
+
+    Returns:
+        tuple: (generated text, None) on success, (None, error message) on failure
+    """
     # Prepare the request payload
     payload = {
         "model": model,
-        "prompt": prompt,
-        "stream": False,
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        "stream": True,
+        "keep_alive": OLLAMA_KEEP_ALIVE,
         "options": {
             "temperature": 0.1,  
             "top_p": 0.9,
             "top_k": 20,
-            "num_predict": 100,  
+            "num_predict": num_predict,
             "stop": ["\n\n", "Example", "Input:", "Original"] 
         }
     }
+    if DRAFT_MODEL:
+        payload["options"]["draft_model"] = DRAFT_MODEL
 
     try:
         # Send request to Ollama
-        response = requests.post(
-            f"{ollama_url}/api/generate",
-            json=payload,
-            headers={"Content-Type": "application/json"},
+        response = SESSION.post(
+            f"{ollama_url}/api/chat",
+            data=orjson.dumps(payload),
+            stream=True,
             timeout=30
         )
 
         # Check if request was successful
         if response.status_code == 200:
-            result = response.json()
-            corrected_text = result.get("response", "").strip()
-            
-            # Clean the response aggressively
-            # Remove newlines and extra spaces first
-            corrected_text = ' '.join(corrected_text.split())
-            
-            # Strategy 1: Remove common prefixes and labels
-            prefixes_to_remove = [
-                "Corrected version:", "Corrected text:", "Corrected:", 
-                "Corrected spelling:", "Corrected Spelling:",
-                "Text:", "Fixed:", "Correction:", "The corrected version is:",
-                "Here is the corrected text:", "Here's the correction:",
-                "The text should be:", "It should be:", "Answer:",
-                "Spelling:", "Fixed spelling:", "Fixed Spelling:"
-            ]
-            for prefix in prefixes_to_remove:
-                # Case-insensitive check
-                if corrected_text.lower().startswith(prefix.lower()):
-                    corrected_text = corrected_text[len(prefix):].strip()
-                    break  # Only remove one prefix
-            
-            # Strategy 2: Remove quotes
-            corrected_text = corrected_text.strip('"').strip("'").strip()
-            
-            # Strategy 2.5: Fix capitalization if model over-capitalized
-            # If original was lowercase/sentence case, but correction is Title Case, fix it
-            if corrected_text and len(corrected_text.split()) > 1:
-                # Check if it's Title Case (every word capitalized)
-                words = corrected_text.split()
-                if all(w[0].isupper() for w in words if w):
-                    # Check if original was NOT title case
-                    orig_words = text.split()
-                    if not all(w[0].isupper() for w in orig_words if w):
-                        # Convert to sentence case (only first word capitalized)
-                        corrected_text = corrected_text[0].upper() + corrected_text[1:].lower()
-            
-            # Strategy 3: If response contains explanations, extract just the correction
-            # Look for sentences that start with explanatory words
-            explanation_starters = [
-                "I think", "This is", "The error", "Note that", "In this",
-                "Here,", "Because", "Since", "As you can see", "The word"
-            ]
-            for starter in explanation_starters:
-                if corrected_text.startswith(starter):
-                    # If it starts with explanation, try to find the actual correction
-                    # Look for quoted text or text after "is"
-                    if '"' in corrected_text:
-                        parts = corrected_text.split('"')
-                        if len(parts) >= 2:
-                            corrected_text = parts[1].strip()
-                    break
-            
-            # Strategy 4: If response is much longer than input, take only first few words
-            words_in_input = len(text.split())
-            words_in_output = len(corrected_text.split())
-            
-            if words_in_output > words_in_input * 3:
-                # Take only the first N words where N is close to input length
-                words = corrected_text.split()
-                corrected_text = ' '.join(words[:words_in_input + 2])
-            
-            # Strategy 5: Check if the output makes sense
-            # If it's completely unrelated to input (no common words), use original
-            input_words = set(text.lower().split())
-            output_words = set(corrected_text.lower().split())
-            
-            # For single word inputs, be more lenient
-            if len(input_words) == 1:
-                # For single words, just check if output is also a single word or very short
-                if len(output_words) > 3:
-                    corrected_text = text
-            else:
-                # For multi-word inputs, check for some overlap
-                common_words = input_words.intersection(output_words)
-                if len(common_words) == 0 and len(output_words) > 2:
-                    # No common words and output is different - likely hallucination
-                    corrected_text = text
-            
-            # Strategy 6: Final validation
-            if len(corrected_text) == 0 or len(corrected_text) > len(text) * 5:
-                corrected_text = text
-            
-            # Find misspelled words by comparing original and corrected text
-            misspelled_words = find_misspelled_words(text, corrected_text)
-            
-            print(f"\n[TERMINAL] Original text: {text}")
-            print(f"[TERMINAL] Corrected text: {corrected_text}")
-            if misspelled_words:
-                print(f"[TERMINAL] Misspelled words found: {misspelled_words}")
-            
-            return {
-                "corrected_text": corrected_text,
-                "misspelled_words": misspelled_words,
-                "error": None
-            }
-        else:
-            error_msg = f"Error: HTTP {response.status_code} - {response.text}"
-            print(f"[TERMINAL] {error_msg}")
-            return {
-                "corrected_text": "",
-                "misspelled_words": [],
-                "error": error_msg
-            }
+            return read_streamed_response(response, max_words, keep_words).strip(), None
+        return None, f"Error: HTTP {response.status_code} - {response.text}"
 
     except requests.exceptions.ConnectionError:
-        error_msg = "Error: Could not connect to Ollama. Make sure Ollama is running on http://localhost:11434"
-        print(f"[TERMINAL] {error_msg}")
-        return {
-            "corrected_text": "",
-            "misspelled_words": [],
-            "error": error_msg
-        }
+        return None, "Error: Could not connect to Ollama. Make sure Ollama is running on http://localhost:11434"
     except requests.exceptions.Timeout:
-        error_msg = "Error: Request to Ollama timed out. The model may be taking too long to respond."
-        print(f"[TERMINAL] {error_msg}")
-        return {
-            "corrected_text": "",
-            "misspelled_words": [],
-            "error": error_msg
-        }
+        return None, "Error: Request to Ollama timed out. The model may be taking too long to respond."
     except requests.exceptions.RequestException as e:
-        error_msg = f"Error: Request failed - {str(e)}"
-        print(f"[TERMINAL] {error_msg}")
-        return {
-            "corrected_text": "",
-            "misspelled_words": [],
-            "error": error_msg
-        }
-    except json.JSONDecodeError:
-        error_msg = "Error: Invalid JSON response from Ollama"
-        print(f"[TERMINAL] {error_msg}")
+        return None, f"Error: Request failed - {str(e)}"
+    except orjson.JSONDecodeError:
+        return None, "Error: Invalid JSON response from Ollama"
+    except OllamaStreamError as e:
+        return None, f"Error: Ollama reported - {str(e)}"
+
+
+def warm_model(model=MODEL_NAME, ollama_url=OLLAMA_URL):
+    """Ask Ollama to load the model ahead of the first request and keep it resident."""
+    payload = {"model": model, "messages": [], "keep_alive": OLLAMA_KEEP_ALIVE}
+    try:
+        SESSION.post(f"{ollama_url}/api/chat", data=orjson.dumps(payload), timeout=120).close()
+    except requests.exceptions.RequestException as e:
+        logger.warning("Could not preload %s: %s", model, e)
+
+
+def error_result(error_msg):
+    """Log an error and wrap it in the /check result shape."""
+    logger.error(error_msg)
+    return {
+        "corrected_text": "",
+        "misspelled_words": [],
+        "error": error_msg
+    }
+
+
+def clean_correction(text, corrected_text, input_tokens):
+    """
+    Clean a raw model answer into the corrected version of text.
+
+    Args:
+        text (str): The original text
+        corrected_text (str): Raw text generated by the model
+        input_tokens (list): text.split(), computed once by the caller
+
+    Returns:
+        str: The cleaned correction, or text itself if the answer is unusable
+    """
+    # Scalars derived from the input, computed once for all strategies
+    n_text = len(text)
+    n_in = len(input_tokens)
+    input_words = set(w.lower() for w in input_tokens)
+
+    # Clean the response aggressively
+    # Remove newlines and extra spaces first; ct_words is the word list of
+    # corrected_text and is only re-split when a strategy rewrites the text
+    ct_words = corrected_text.split()
+    corrected_text = ' '.join(ct_words)
+    
+    # Strategy 1: Remove common prefixes and labels (case-insensitive, only one)
+    # Strategy 2: Remove quotes
+    cleaned = _PREFIX_RE.sub("", corrected_text, count=1).strip('"').strip("'").strip()
+    if cleaned != corrected_text:
+        corrected_text = cleaned
+        ct_words = corrected_text.split()
+    
+    # Strategy 2.5: Fix capitalization if model over-capitalized
+    # If original was lowercase/sentence case, but correction is Title Case, fix it
+    # Check if it's Title Case (every word capitalized)
+    if len(ct_words) > 1 and all(w[0].isupper() for w in ct_words):
+        # Check if original was NOT title case
+        if not all(w[0].isupper() for w in input_tokens):
+            # Convert to sentence case (only first word capitalized)
+            corrected_text = corrected_text[0].upper() + corrected_text[1:].lower()
+            ct_words = corrected_text.split()
+    
+    # Strategy 3: If response contains explanations, extract just the correction
+    # Look for sentences that start with explanatory words
+    if _EXPLANATION_RE.match(corrected_text):
+        # If it starts with explanation, try to find the actual correction
+        # Look for quoted text or text after "is"
+        if '"' in corrected_text:
+            parts = corrected_text.split('"')
+            if len(parts) >= 2:
+                corrected_text = parts[1].strip()
+                ct_words = corrected_text.split()
+    
+    # Strategy 4: If response is much longer than input, take only first few words
+    # (a stream cut off by its word budget is already trimmed to n_in + 2 words;
+    # this catches answers that ended on their own but are still too long)
+    if len(ct_words) > n_in * 3:
+        # Take only the first N words where N is close to input length
+        ct_words = ct_words[:n_in + 2]
+        corrected_text = ' '.join(ct_words)
+    
+    # Strategy 5: Check if the output makes sense
+    # If it's completely unrelated to input (no common words), use original
+    output_words = set(w.lower() for w in ct_words)
+    
+    # For single word inputs, be more lenient
+    if len(input_words) == 1:
+        # For single words, just check if output is also a single word or very short
+        if len(output_words) > 3:
+            corrected_text = text
+    else:
+        # For multi-word inputs, check for some overlap
+        common_words = input_words.intersection(output_words)
+        if len(common_words) == 0 and len(output_words) > 2:
+            # No common words and output is different - likely hallucination
+            corrected_text = text
+    
+    # Strategy 6: Final validation
+    if len(corrected_text) == 0 or len(corrected_text) > n_text * 5:
+        corrected_text = text
+    
+    return corrected_text
+
+
+def build_result(text, corrected_text, orig_tokens=None):
+    """Find the misspelled words for a finished correction and log the outcome."""
+    # Find misspelled words by comparing original and corrected text
+    misspelled_words = find_misspelled_words(text, corrected_text, orig_tokens=orig_tokens)
+    
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("Original text: %s", text)
+        logger.info("Corrected text: %s", corrected_text)
+        if misspelled_words:
+            logger.info("Misspelled words found: %s", misspelled_words)
+    
+    return {
+        "corrected_text": corrected_text,
+        "misspelled_words": misspelled_words,
+        "error": None
+    }
+
+
+def check_spelling_grammar(text, model=MODEL_NAME, ollama_url=OLLAMA_URL):
+    """
+    Send text to Ollama for spell check and grammar correction.
+
+    Args:
+        text (str): The text to check
+        model (str): Ollama model to use (default: MODEL_NAME)
+        ollama_url (str): Ollama server URL (default: "http://localhost:11434")
+
+    Returns:
+        dict: Dictionary containing corrected text, misspelled words, and suggestions
+    """
+    if not text or not text.strip():
         return {
             "corrected_text": "",
             "misspelled_words": [],
-            "error": error_msg
+            "error": "No text provided"
         }
 
+    # Tokenize the input once; the word count drives the decode budget,
+    # the streaming cut-off and the validation strategies, and the
+    # regex tokens are reused when looking for misspelled words
+    input_tokens = text.split()
+    n_in = len(input_tokens)
+    orig_tokens = _WORD_RE.findall(text)
+
+    # A correction is about as long as the input, so stop generating
+    # a few words past that instead of trimming the excess afterwards.
+    # The instructions live in SYSTEM_PROMPT, so the user turn is just the text
+    max_words = max(n_in + 4, 8)
+    # Past the budget, keep n_in + 2 words like Strategy 4 does
+    generated, error_msg = generate_text(text, num_predict_for(n_in), max_words, model, ollama_url,
+                                         keep_words=n_in + 2)
+    if error_msg:
+        return error_result(error_msg)
+
+    corrected_text = clean_correction(text, generated, input_tokens)
+    return build_result(text, corrected_text, orig_tokens)
+
+
+_NUMBERED_LINE_RE = re.compile(r"^\s*(\d+)\s*[:.)]\s*(.*)$")
+def batch_answer_fits(answer, text, number):
+    """
+    Check that a numbered batch answer belongs to text before it is used.
+
+    Rejects answers that carry the next line's "N:" marker (two answers
+    fused onto one line), share no words with the input, or differ too much
+    from it in length, so one caller's text can never leak into another's
+    result. Times and other numbers ("10:30", "version 2.0") are left alone.
+
+    Args:
+        answer (str): Answer text parsed from line `number`
+        text (str): The input that was sent as line `number`
+        number (int): The line number the answer was given under
+    """
+    # "(?!\d)" keeps times like "2:30" from counting as the marker for line 2
+    next_marker = re.compile(rf"\b{number + 1}\s*:(?!\d)")
+    if next_marker.search(answer) and not next_marker.search(text):
+        return False
+    input_words = [w.lower() for w in _WORD_RE.findall(text)]
+    answer_words = [w.lower() for w in _WORD_RE.findall(answer)]
+    if not answer_words:
+        return False
+    if abs(len(answer_words) - len(input_words)) > max(2, len(input_words) // 4):
+        return False
+    # A one-word input is usually the misspelled word itself, so overlap
+    # is only required once there are other words to match on
+    if len(input_words) > 1 and not set(input_words) & set(answer_words):
+        return False
+    return True
+
 
-def find_misspelled_words(original, corrected):
+def batch_item_budget(text):
+    """Decode tokens one text adds to a batch: its own budget plus a few for the line number."""
+    return num_predict_for(len(text.split())) + 4
+
+
+def check_spelling_batch(texts, model=MODEL_NAME, ollama_url=OLLAMA_URL):
+    """
+    Spell check several texts with a single Ollama call.
+
+    The texts are sent as one numbered prompt and the numbered answer lines
+    are mapped back to their inputs. An answer is only used if it still looks
+    like a correction of its own input (see batch_answer_fits). Texts the
+    model skipped or answered unusably come back as None so the caller can
+    retry them on their own without holding up the rest of the batch.
+
+    Args:
+        texts (list): The texts to check
+        model (str): Ollama model to use (default: MODEL_NAME)
+        ollama_url (str): Ollama server URL (default: "http://localhost:11434")
+
+    Returns:
+        list: One check_spelling_grammar-style result dict (or None) per text, in order
+    """
+    results = [None] * len(texts)
+    pending = []
+    for index, text in enumerate(texts):
+        if text and text.strip():
+            pending.append(index)
+        else:
+            results[index] = check_spelling_grammar(text, model, ollama_url)
+
+    if len(pending) == 1:
+        index = pending[0]
+        results[index] = check_spelling_grammar(texts[index], model, ollama_url)
+    elif pending:
+        input_tokens = {index: texts[index].split() for index in pending}
+        lines = "\n".join(
+            f"{number}: {' '.join(input_tokens[index])}"
+            for number, index in enumerate(pending, 1)
+        )
+        prompt = f"""Correct each numbered line and keep its number:
+{lines}"""
+
+        num_predict = min(BATCH_TOKEN_BUDGET,
+                          sum(batch_item_budget(texts[index]) for index in pending))
+        max_words = sum(max(len(input_tokens[index]) + 4, 8) + 1 for index in pending)
+        generated, error_msg = generate_text(prompt, num_predict, max_words, model, ollama_url)
+        if error_msg:
+            logger.error(error_msg)
+            for index in pending:
+                results[index] = {
+                    "corrected_text": "",
+                    "misspelled_words": [],
+                    "error": error_msg
+                }
+            return results
+
+        answers = {}
+        for line in generated.splitlines():
+            match = _NUMBERED_LINE_RE.match(line)
+            if match:
+                answers.setdefault(int(match.group(1)), match.group(2))
+
+        for number, index in enumerate(pending, 1):
+            text = texts[index]
+            if number in answers and batch_answer_fits(answers[number], text, number):
+                corrected_text = clean_correction(text, answers[number], input_tokens[index])
+                results[index] = build_result(text, corrected_text)
+
+    return results
+
+
+_BATCH_Q = queue.Queue()
+_BATCH_WORKER = None
+_RETRY_POOL = None
+_BATCH_WORKER_LOCK = threading.Lock()
+
+
+def _start_item(item):
+    """Mark a queued item as running, or return False if its caller has given up."""
+    _, future, deadline = item
+    if not future.set_running_or_notify_cancel():
+        return False
+    if time.monotonic() > deadline:
+        future.set_exception(FutureTimeoutError())
+        return False
+    return True
+
+
+def _retry_single(text, future, deadline):
+    """Check one text on its own for a batch item the model did not answer usably."""
+    if time.monotonic() > deadline:
+        future.set_exception(FutureTimeoutError())
+        return
+    try:
+        future.set_result(check_spelling_grammar(text))
+    except Exception as e:
+        future.set_exception(e)
+
+
+def _batch_worker():
+    """Drain _BATCH_Q, run each batch through check_spelling_batch and resolve the futures."""
+    # An item that did not fit the previous batch's token budget opens the next one
+    carry = None
+    while True:
+        if carry is not None:
+            batch, carry = [carry], None
+        else:
+            batch = [_BATCH_Q.get()]
+        budget = batch_item_budget(batch[0][0])
+        # Fast path: nothing else is waiting, so run the lone request right away.
+        # Requests that arrive while a call is in flight are picked up together.
+        if not _BATCH_Q.empty():
+            deadline = time.monotonic() + BATCH_WAIT
+            while len(batch) < BATCH_MAX_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = _BATCH_Q.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                cost = batch_item_budget(item[0])
+                if budget + cost > BATCH_TOKEN_BUDGET:
+                    carry = item
+                    break
+                batch.append(item)
+                budget += cost
+
+        # Skip requests whose caller already timed out
+        batch = [item for item in batch if _start_item(item)]
+        if not batch:
+            continue
+
+        try:
+            results = check_spelling_batch([text for text, _, _ in batch])
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+        else:
+            for (text, future, item_deadline), result in zip(batch, results):
+                if result is None:
+                    # Retried off this thread so the next batch is not held up
+                    _RETRY_POOL.submit(_retry_single, text, future, item_deadline)
+                else:
+                    future.set_result(result)
+
+
+def submit_check(text):
+    """Queue text for the batch worker and return a Future for its result dict."""
+    global _BATCH_WORKER, _RETRY_POOL
+    with _BATCH_WORKER_LOCK:
+        # Started lazily so forked server workers each get their own threads
+        if _BATCH_WORKER is None or not _BATCH_WORKER.is_alive():
+            _RETRY_POOL = ThreadPoolExecutor(max_workers=BATCH_RETRY_WORKERS,
+                                             thread_name_prefix="spellcheck-retry")
+            _BATCH_WORKER = threading.Thread(target=_batch_worker, name="spellcheck-batcher", daemon=True)
+            _BATCH_WORKER.start()
+    future = Future()
+    _BATCH_Q.put((text, future, time.monotonic() + BATCH_RESULT_TIMEOUT))
+    return future
+
+
+def find_misspelled_words(original, corrected, orig_tokens=None):
     """
     Compare original and corrected text to find misspelled words.
     Uses fuzzy matching to identify actual spelling corrections.
+
+    orig_tokens can carry _WORD_RE.findall(original) when the caller has
+    already tokenized the original text.
     """
-    import re
-    from difflib import SequenceMatcher
-    
     # Normalize and split into words
-    original_words = re.findall(r'\b\w+\b', original)
-    corrected_words = re.findall(r'\b\w+\b', corrected)
+    original_words = orig_tokens if orig_tokens is not None else _WORD_RE.findall(original)
+    corrected_words = _WORD_RE.findall(corrected)
+    # Fold case once; alignment and scoring below only use the folded lists
+    original_lower_words = [w.lower() for w in original_words]
+    corrected_lower_words = [w.lower() for w in corrected_words]
+    
+    # Nothing changed apart from case or punctuation: skip the alignment
+    if original_lower_words == corrected_lower_words:
+        return []
     
     misspelled = []
     
-    # Use SequenceMatcher to align words
-    matcher = SequenceMatcher(None, 
-                             [w.lower() for w in original_words], 
-                             [w.lower() for w in corrected_words])
+    # Align the word lists with a word-level Levenshtein edit script (computed in C).
+    # Adjacent non-equal opcodes are merged into one changed block so that
+    # insertions next to a replacement pair up the same way SequenceMatcher did.
+    blocks = []
+    for tag, i1, i2, j1, j2 in Levenshtein.opcodes(original_lower_words, corrected_lower_words):
+        if tag == 'equal':
+            continue
+        if blocks and blocks[-1][1] == i1 and blocks[-1][3] == j1:
+            blocks[-1][1] = i2
+            blocks[-1][3] = j2
+        else:
+            blocks.append([i1, i2, j1, j2])
     
-    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
-        if tag == 'replace':
-            # Words were changed - these are likely spelling corrections
-            for i, j in zip(range(i1, i2), range(j1, j2)):
-                orig_word = original_words[i] if i < len(original_words) else None
-                corr_word = corrected_words[j] if j < len(corrected_words) else None
-                
-                if orig_word and corr_word:
-                    # Only consider it a spelling error if words are similar but different
-                    # (not just capitalization changes)
-                    if orig_word.lower() != corr_word.lower():
-                        similarity = SequenceMatcher(None, orig_word.lower(), corr_word.lower()).ratio()
-                        # If similarity is high (0.5-0.9), it's likely a spelling correction
-                        # If too different, might be a word replacement
-                        if 0.3 <= similarity < 1.0:
-                            misspelled.append({
-                                "word": orig_word,
-                                "suggestion": corr_word
-                            })
+    for i1, i2, j1, j2 in blocks:
+        # Words were changed - these are likely spelling corrections
+        for i, j in zip(range(i1, i2), range(j1, j2)):
+            orig_lower = original_lower_words[i]
+            corr_lower = corrected_lower_words[j]
+            # Only consider it a spelling error if words are similar but different
+            # (not just capitalization changes)
+            if orig_lower != corr_lower:
+                # Same 2*matches/total score as SequenceMatcher.ratio(), computed in C
+                similarity = Indel.normalized_similarity(orig_lower, corr_lower)
+                # If similarity is high (0.5-0.9), it's likely a spelling correction
+                # If too different, might be a word replacement
+                if 0.3 <= similarity < 1.0:
+                    misspelled.append({
+                        "word": original_words[i],
+                        "suggestion": corrected_words[j]
+                    })
     
     return misspelled
 
 
+def json_response(payload):
+    """Serialize payload with orjson into a Flask JSON response."""
+    return app.response_class(orjson.dumps(payload), mimetype="application/json")
+
+
 @app.route('/')
 def index():
     """Render the main page"""
@@ -254,19 +716,51 @@ def check_spell():
         text = data.get('text', '')
         
         if not text:
-            return jsonify({
+            return json_response({
                 "corrected_text": "",
                 "misspelled_words": [],
                 "error": "No text provided"
             }), 400
         
-        result = check_spelling_grammar(text)
-        return jsonify(result), 200
+        if len(text) > MAX_TEXT_CHARS or len(text.split()) > MAX_TEXT_WORDS:
+            error_msg = (f"Text too long: limit is {MAX_TEXT_CHARS} characters "
+                         f"and {MAX_TEXT_WORDS} words")
+            logger.warning("Rejected %d-character request: %s", len(text), error_msg)
+            return json_response({
+                "corrected_text": "",
+                "misspelled_words": [],
+                "error": error_msg
+            }), 413
         
+        # Text made only of dictionary words needs no correction
+        if all_words_known(text):
+            return json_response({
+                "corrected_text": text,
+                "misspelled_words": [],
+                "error": None
+            }), 200
+        
+        # Repeated submissions skip the LLM and post-processing entirely
+        result = cache_lookup(text)
+        if result is None:
+            future = submit_check(text)
+            try:
+                result = future.result(timeout=BATCH_RESULT_TIMEOUT)
+            except FutureTimeoutError:
+                # Let the worker skip it if it has not been picked up yet
+                future.cancel()
+                raise
+            # Only cache real answers, never the error branches
+            if not result.get("error"):
+                cache_update(text, result)
+        return json_response(result), 200
+        
+    except FutureTimeoutError:
+        return json_response(error_result("Error: Timed out waiting for the spell checker.")), 504
     except Exception as e:
         error_msg = f"Server error: {str(e)}"
-        print(f"[TERMINAL] {error_msg}")
-        return jsonify({
+        logger.error(error_msg)
+        return json_response({
             "corrected_text": "",
             "misspelled_words": [],
             "error": error_msg
@@ -279,9 +773,16 @@ if __name__ == '__main__':
     print("=" * 60)
     print(f"Ollama URL: {OLLAMA_URL}")
     print(f"Model: {MODEL_NAME}")
+    if DRAFT_MODEL:
+        print(f"Draft model: {DRAFT_MODEL}")
+    print(f"Dictionary: {len(DICTIONARY)} words from {WORDLIST_PATH}")
     print("=" * 60)
     print("Make sure Ollama is running with: ollama serve")
-    print("And the model is pulled with: ollama pull tinyllama")
+    print(f"And the model is pulled with: ollama pull {MODEL_NAME}")
+    print("=" * 60)
+    print("For production use: gunicorn -k gevent -w $(nproc) --timeout 60 --bind 0.0.0.0:5000 wsgi:app")
     print("=" * 60)
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    threading.Thread(target=warm_model, name="spellcheck-warmup", daemon=True).start()
+    # Development server only; the debugger and reloader are opt-in via FLASK_DEBUG=1
+    app.run(debug=os.getenv("FLASK_DEBUG") == "1", host='0.0.0.0', port=5000)
 
@@ -0,0 +1,118 @@
+import app
+
+
+def test_batch_rejects_fused_answer_lines(monkeypatch):
+    """Two answers on one line must not leak the second text into the first result."""
+    def fake_generate(prompt, num_predict, max_words, model=None, ollama_url=None, keep_words=None):
+        return "1: The cat sat. 2: My password is hunter2", None
+
+    monkeypatch.setattr(app, "generate_text", fake_generate)
+
+    results = app.check_spelling_batch(["teh cat sat", "my pasword is huntr2"])
+
+    # Neither answer is usable, so both are handed back for a single retry
+    assert results == [None, None]
+
+
+def test_retry_skips_callers_that_gave_up(monkeypatch):
+    calls = []
+    monkeypatch.setattr(app, "check_spelling_grammar", lambda text: calls.append(text))
+
+    future = app.Future()
+    future.set_running_or_notify_cancel()
+    app._retry_single("teh cat", future, deadline=0)
+
+    assert calls == []
+    assert isinstance(future.exception(), app.FutureTimeoutError)
+
+
+def test_worker_skips_cancelled_items():
+    future = app.Future()
+    future.cancel()
+    assert not app._start_item(("teh cat", future, float("inf")))
+
+
+def test_batch_answer_fits():
+    assert app.batch_answer_fits("The cat sat.", "teh cat sat", 1)
+    assert app.batch_answer_fits("the", "teh", 1)
+    assert not app.batch_answer_fits("The cat sat. 2: My password is hunter2", "teh cat sat", 1)
+    assert not app.batch_answer_fits("Completely unrelated words", "teh cat sat", 1)
+    assert not app.batch_answer_fits("", "teh cat sat", 1)
+
+
+def test_batch_answer_fits_allows_numbers_in_the_text():
+    assert app.batch_answer_fits("Meet me at 10:30", "meat me at 10:30", 1)
+    assert app.batch_answer_fits("Meet me at 2:30", "meat me at 2:30", 1)
+    assert app.batch_answer_fits("I am 25.", "I am 25.", 3)
+    assert app.batch_answer_fits("Update to version 2.0 (see 3)", "updat to version 2.0 (see 3)", 2)
+    # The input itself contains the next line's marker, so it is not a fused line
+    assert app.batch_answer_fits("Step 2: stir the pot", "step 2: stir teh pot", 1)
+
+
+def test_batch_decode_budget_is_capped(monkeypatch):
+    budgets = []
+
+    def fake_generate(prompt, num_predict, max_words, model=None, ollama_url=None, keep_words=None):
+        budgets.append(num_predict)
+        return "", None
+
+    monkeypatch.setattr(app, "generate_text", fake_generate)
+
+    app.check_spelling_batch(["word " * 300] * 8)
+
+    assert budgets == [app.BATCH_TOKEN_BUDGET]
+
+
+class FakeStream:
+    """Stands in for a streamed requests.Response from /api/chat."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    def iter_lines(self):
+        for chunk in self.chunks:
+            yield app.orjson.dumps(chunk)
+
+    def close(self):
+        self.closed = True
+
+
+def content_chunks(pieces):
+    return [{"message": {"content": piece}, "done": False} for piece in pieces]
+
+
+def test_stream_cut_off_drops_partial_word_and_trims():
+    text = "Ths is a tst sentance"
+    n_in = len(text.split())
+    pieces = ["This", " is", " a", " test", " sentence", ".", " It", " has",
+              " been", " correct", "ed", " for", " you", " to", " read"]
+    response = FakeStream(content_chunks(pieces))
+
+    generated = app.read_streamed_response(response, max(n_in + 4, 8), keep_words=n_in + 2)
+
+    assert generated == "This is a test sentence. It has"
+    assert response.closed
+
+
+def test_stream_cut_off_without_trim_keeps_whole_words():
+    pieces = ["1: one two three\n", "2: four five six", " sev"]
+    generated = app.read_streamed_response(FakeStream(content_chunks(pieces)), 8)
+
+    assert generated == "1: one two three\n2: four five six"
+
+
+def test_stream_error_chunk_is_reported(monkeypatch):
+    response = FakeStream([{"error": "model runner has unexpectedly stopped"}])
+
+    def fake_post(*args, **kwargs):
+        return response
+
+    response.status_code = 200
+    monkeypatch.setattr(app.SESSION, "post", fake_post)
+
+    generated, error_msg = app.generate_text("Ths is a tst", 16, 8)
+
+    assert generated is None
+    assert "model runner has unexpectedly stopped" in error_msg
+    assert app.check_spelling_grammar("Ths is a tst")["error"]
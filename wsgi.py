@@ -0,0 +1,13 @@
+"""WSGI entry point for running the spell checker under a production server.
+
+    gunicorn -k gevent -w $(nproc) --timeout 60 --bind 0.0.0.0:5000 wsgi:app
+"""
+import threading
+
+from app import app, warm_model
+
+# Load the model in the background so the first request does not pay for it
+threading.Thread(target=warm_model, name="spellcheck-warmup", daemon=True).start()
+
+if __name__ == '__main__':
+    app.run(host='0.0.0.0', port=5000)